@@ -1,13 +1,26 @@
 import streamlit as st
 import pandas as pd
-import requests
+import numpy as np
+import httpx
 import random
 import os
+import time
+import atexit
+import asyncio
+import functools
+import io
+import heapq
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library json module
+    orjson = None
+
 # ============================================================================
 # Configuration & Constants
 # ============================================================================
@@ -17,85 +30,368 @@ AUDIO_DIR = Path("audio")
 SPEAKER_IDS = [13]
 TTS_BASE_URL = "http://localhost:50021"
 PROGRESS_FILE = "progress.json"
-FEEDBACK_FILE = "audio_feedback.json"
+PROGRESS_ARRAYS_FILE = "progress.npz"  # Per-pair SRS progress, one array per field
+PROGRESS_LOG_FILE = "progress.log.jsonl"  # Append-only per-answer log, folded into the progress files on compaction
+FEEDBACK_FILE = "audio_feedback.jsonl"  # One JSON feedback entry per line
+LEGACY_FEEDBACK_FILE = "audio_feedback.json"  # Older single JSON array, migrated to FEEDBACK_FILE
+TTS_CONCURRENCY = 16  # Maximum number of in-flight TTS requests during audio generation
 DAILY_TARGET = 20  # Realistic daily target: 20 questions per day
+DAILY_STATS_RETENTION_DAYS = 30  # Older days are folded into lifetime_stats on load
+SAVE_EVERY_N_ANSWERS = 5  # Rewrite the full progress file after this many changed pairs...
+SAVE_INTERVAL_SECONDS = 60  # ...or when this much time has passed since the last full save
+LOG_COMPACT_INTERVAL_SECONDS = 30  # Background folding of the progress log into the progress files
+SIDEBAR_REFRESH_SECONDS = 30  # The sidebar stats fragment re-renders on this timer, not on every answer
+SELECT_CANDIDATES = 8  # Urgent pairs considered at once when picking the next question
+
+# Per-pair progress is stored column-wise: field -> (dtype, default for new pairs; None = due now)
+PROGRESS_FIELDS = {
+    "correct_streak": (np.int16, 0),
+    "ease_factor": (np.float32, 2.5),
+    "interval_days": (np.float32, 0),
+    "next_review": (np.float64, None),
+    "ever_correct": (np.bool_, False)
+}
+
+# ============================================================================
+# Progress Arrays
+# ============================================================================
+
+def resize_progress(progress, size):
+    """Return progress arrays trimmed or padded with defaults to cover `size` pairs."""
+    now_ts = _now_ts()
+    resized = {}
+    for field, (dtype, default) in PROGRESS_FIELDS.items():
+        column = np.full(size, now_ts if default is None else default, dtype=dtype)
+        if progress is not None:
+            kept = min(size, len(progress[field]))
+            column[:kept] = progress[field][:kept]
+        resized[field] = column
+    return resized
+
+def apply_progress_rows(progress, rows):
+    """Write per-pair progress dicts (keyed by pair_id) into progress arrays, growing them if needed."""
+    if not rows:
+        return progress
+    
+    progress = resize_progress(progress, max(len(progress["correct_streak"]), max(rows) + 1))
+    for pair_id, row in rows.items():
+        # Older progress files stored next_review as an ISO format string
+        if isinstance(row["next_review"], str):
+            row["next_review"] = datetime.fromisoformat(row["next_review"]).timestamp()
+        for field in PROGRESS_FIELDS:
+            progress[field][pair_id] = row[field]
+    return progress
+
+def get_progress(pair_id):
+    """Get a pair's progress as a plain dict."""
+    return {field: column[pair_id].item() for field, column in st.session_state.progress.items()}
+
+def set_progress(pair_id, **fields):
+    """Update fields of a pair's progress."""
+    for field, value in fields.items():
+        st.session_state.progress[field][pair_id] = value
+
+def bulk_init_progress(n):
+    """Size the progress arrays to cover exactly n pairs, adding defaults for new pairs."""
+    if len(st.session_state.progress["correct_streak"]) != n:
+        st.session_state.progress = resize_progress(st.session_state.progress, n)
+        st.session_state.outstanding = None
+        st.session_state.mastered_count = None
+        st.session_state.type_stats = None
+        st.session_state.due_heap = None
 
 # ============================================================================
 # Local Storage Functions
 # ============================================================================
 
+def dumps_json(data, indent=False):
+    """Serialize data to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    return json.dumps(data, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+def loads_json(data):
+    """Parse UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _now_ts():
+    """Current time as a Unix timestamp, the format used for next_review."""
+    return datetime.now().timestamp()
+
+@st.cache_resource
+def progress_file_lock():
+    """Process-wide lock serializing progress log appends and compactions."""
+    return threading.Lock()
+
+def write_bytes_atomic(path, data):
+    """Write bytes to a temp file next to `path`, then swap it in so readers never see a partial file."""
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+def write_progress_files(save_data, progress):
+    """Write progress arrays to PROGRESS_ARRAYS_FILE and everything else to PROGRESS_FILE."""
+    arrays = io.BytesIO()
+    np.savez(arrays, **progress)
+    write_bytes_atomic(PROGRESS_ARRAYS_FILE, arrays.getvalue())
+    write_bytes_atomic(PROGRESS_FILE, dumps_json(save_data, indent=True))
+
+def build_save_data():
+    """Collect everything except the progress arrays that goes into PROGRESS_FILE."""
+    return {
+        "session_correct": st.session_state.session_correct,
+        "session_total": st.session_state.session_total,
+        "current_streak": st.session_state.current_streak,
+        # Copied so a background write never sees the dicts change mid-serialization
+        "daily_stats": {date: dict(stats) for date, stats in st.session_state.get("daily_stats", {}).items()},
+        "lifetime_stats": dict(st.session_state.get("lifetime_stats", {})),
+        "last_saved": datetime.now().isoformat()
+    }
+
 def save_progress():
-    """Save progress to local JSON file."""
+    """Save progress to local files."""
     try:
-        # Convert datetime objects to ISO format strings
-        serializable_progress = {}
-        for pair_id, data in st.session_state.progress.items():
-            serializable_progress[pair_id] = {
-                "correct_streak": data["correct_streak"],
-                "ease_factor": data["ease_factor"],
-                "interval_days": data["interval_days"],
-                "next_review": data["next_review"].isoformat(),
-                "ever_correct": data["ever_correct"]
-            }
+        write_progress_files(build_save_data(), st.session_state.progress)
         
-        save_data = {
-            "progress": serializable_progress,
-            "session_correct": st.session_state.session_correct,
-            "session_total": st.session_state.session_total,
-            "current_streak": st.session_state.current_streak,
-            "daily_stats": st.session_state.get("daily_stats", {}),
-            "last_saved": datetime.now().isoformat()
+        return True
+    except Exception as e:
+        st.error(f"Failed to save progress: {e}")
+        return False
+
+def append_progress_log(pair_id):
+    """Append a single pair's progress to the append-only log."""
+    try:
+        today = datetime.now().strftime("%Y-%m-%d")
+        daily_stats = st.session_state.get("daily_stats", {})
+        entry = {
+            "pair_id": pair_id,
+            **get_progress(pair_id),
+            # Session-level state rides along so replaying the log restores it as well
+            "session": {
+                "session_correct": st.session_state.session_correct,
+                "session_total": st.session_state.session_total,
+                "current_streak": st.session_state.current_streak,
+                "daily_stats": {today: daily_stats[today]} if today in daily_stats else {}
+            }
         }
-        
-        with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, indent=2, ensure_ascii=False)
-        
+        with progress_file_lock(), open(PROGRESS_LOG_FILE, 'ab') as f:
+            f.write(dumps_json(entry) + b"\n")
         return True
     except Exception as e:
+        st.error(f"Failed to log progress: {e}")
+        return False
+
+def compact_progress():
+    """Rewrite the full progress file and truncate the append-only log."""
+    with progress_file_lock():
+        if not save_progress():
+            return False
+        
+        # Everything in the log is now part of the progress files
+        Path(PROGRESS_LOG_FILE).unlink(missing_ok=True)
+    st.session_state._progress_dirty = set()
+    st.session_state._last_progress_save = time.monotonic()
+    st.session_state._background_save = None  # Any earlier background write is superseded
+    return True
+
+def compact_progress_in_background():
+    """Snapshot progress and compact it from a background thread, off the rerun's critical path.
+    
+    The file lock is taken here and released by the writer thread, so no log
+    append or other compaction can slip in between the snapshot and the write.
+    """
+    lock = progress_file_lock()
+    if not lock.acquire(blocking=False):
+        return False  # A write is already in progress; the next answer retries
+    
+    # The writer only touches this plain dict; collect_background_save() reads it back on a later run
+    result = {"pairs": set(st.session_state._progress_dirty), "done": False, "error": None}
+    
+    def write_snapshot(save_data, progress):
+        try:
+            write_progress_files(save_data, progress)
+            Path(PROGRESS_LOG_FILE).unlink(missing_ok=True)
+        except Exception as e:
+            result["error"] = e  # The log is left intact and folded in by the next compaction
+        finally:
+            result["done"] = True
+            lock.release()
+    
+    try:
+        progress = {field: column.copy() for field, column in st.session_state.progress.items()}
+        threading.Thread(
+            target=write_snapshot, args=(build_save_data(), progress),
+            name="progress-writer", daemon=True
+        ).start()
+    except Exception as e:
+        lock.release()
         st.error(f"Failed to save progress: {e}")
         return False
+    
+    st.session_state._background_save = result
+    return True
+
+def collect_background_save():
+    """Apply the outcome of a finished background save; returns False while one is still running.
+    
+    Pairs stay dirty until their write succeeds, so a failed save is retried and reported.
+    """
+    result = st.session_state.get("_background_save")
+    if result is None:
+        return True
+    if not result["done"]:
+        return False
+    
+    st.session_state._background_save = None
+    if result["error"] is not None:
+        st.error(f"Failed to save progress: {result['error']}")
+    else:
+        st.session_state._progress_dirty -= result["pairs"]
+        st.session_state._last_progress_save = time.monotonic()
+    return True
+
+def schedule_save():
+    """Compact progress once enough pairs changed or enough time passed since the last save."""
+    if not collect_background_save():
+        return  # The previous background save is still being written
+    
+    dirty_count = len(st.session_state._progress_dirty)
+    elapsed = time.monotonic() - st.session_state._last_progress_save
+    if dirty_count >= SAVE_EVERY_N_ANSWERS or (dirty_count and elapsed > SAVE_INTERVAL_SECONDS):
+        compact_progress_in_background()
+
+def read_progress_files():
+    """Read saved progress and replay the append-only log over it."""
+    save_data = {}
+    if Path(PROGRESS_FILE).exists():
+        save_data = loads_json(Path(PROGRESS_FILE).read_bytes())
+    
+    if Path(PROGRESS_ARRAYS_FILE).exists():
+        with np.load(PROGRESS_ARRAYS_FILE) as arrays:
+            # Files written with older dtypes are narrowed to the current ones
+            progress = {field: arrays[field].astype(dtype, copy=False) for field, (dtype, _) in PROGRESS_FIELDS.items()}
+    else:
+        # Older progress files kept one dict per pair inside PROGRESS_FILE
+        legacy_rows = {int(pair_id): row for pair_id, row in save_data.pop("progress", {}).items()}
+        progress = apply_progress_rows(resize_progress(None, 0), legacy_rows)
+    
+    log_rows = {}
+    if Path(PROGRESS_LOG_FILE).exists():
+        with open(PROGRESS_LOG_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    entry = loads_json(line)
+                except ValueError:
+                    continue  # Blank or partially written line from an interrupted append
+                log_rows[int(entry.pop("pair_id"))] = entry
+                
+                session = entry.pop("session", None)
+                if session is not None:
+                    save_data.setdefault("daily_stats", {}).update(session.pop("daily_stats"))
+                    save_data.update(session)
+    
+    return save_data, apply_progress_rows(progress, log_rows)
+
+def compact_progress_files(lock):
+    """Fold the append-only log into the progress files without touching session state."""
+    with lock:
+        if not Path(PROGRESS_LOG_FILE).exists():
+            return
+        
+        write_progress_files(*read_progress_files())
+        Path(PROGRESS_LOG_FILE).unlink()
+
+@st.cache_resource
+def start_progress_flushers():
+    """Compact the progress log periodically and on process exit (set up once per server process).
+    
+    Streamlit has no public session-end callback; since every answer is already in
+    the log, compacting it from here covers closed tabs without needing session state.
+    """
+    # Resolved here because the cached lock cannot be looked up from outside a script run
+    lock = progress_file_lock()
+    
+    def compact_periodically():
+        while True:
+            time.sleep(LOG_COMPACT_INTERVAL_SECONDS)
+            try:
+                compact_progress_files(lock)
+            except Exception:
+                pass  # Retried on the next interval; the log is left intact
+    
+    atexit.register(compact_progress_files, lock)
+    threading.Thread(target=compact_periodically, name="progress-log-compactor", daemon=True).start()
 
 def load_progress():
-    """Load progress from local JSON file."""
+    """Load progress from local files and the append-only log."""
     try:
-        if not Path(PROGRESS_FILE).exists():
+        if not any(Path(path).exists() for path in (PROGRESS_FILE, PROGRESS_ARRAYS_FILE, PROGRESS_LOG_FILE)):
             return False
         
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            save_data = json.load(f)
-        
-        # Convert ISO format strings back to datetime objects
-        loaded_progress = {}
-        for pair_id, data in save_data.get("progress", {}).items():
-            loaded_progress[int(pair_id)] = {
-                "correct_streak": data["correct_streak"],
-                "ease_factor": data["ease_factor"],
-                "interval_days": data["interval_days"],
-                "next_review": datetime.fromisoformat(data["next_review"]),
-                "ever_correct": data["ever_correct"]
-            }
+        with progress_file_lock():
+            save_data, loaded_progress = read_progress_files()
         
         st.session_state.progress = loaded_progress
+        st.session_state.outstanding = None
+        st.session_state.mastered_count = None
+        st.session_state.type_stats = None
+        st.session_state.due_heap = None
+        
+        # On the first run the CSV is not loaded yet; main() sizes the arrays right after loading it
+        if st.session_state.get("pairs") is not None:
+            bulk_init_progress(st.session_state.pairs["n"])
         st.session_state.session_correct = save_data.get("session_correct", 0)
         st.session_state.session_total = save_data.get("session_total", 0)
         st.session_state.current_streak = save_data.get("current_streak", 0)
         st.session_state.daily_stats = save_data.get("daily_stats", {})
+        st.session_state._today_stats_cache = None
+        st.session_state.lifetime_stats = prune_daily_stats(
+            st.session_state.daily_stats, save_data.get("lifetime_stats", {})
+        )
+        st.session_state.daily_deque = build_daily_deque(st.session_state.daily_stats)
         
         return True
     except Exception as e:
         st.error(f"Failed to load progress: {e}")
         return False
 
+@st.cache_resource
+def migrate_feedback_file():
+    """Convert the older JSON-array feedback file to JSON Lines (runs once per process).
+    
+    Raises ValueError/OSError on failure; cache_resource does not cache exceptions,
+    so a failed migration is retried on the next run.
+    """
+    legacy_path = Path(LEGACY_FEEDBACK_FILE)
+    if not legacy_path.exists():
+        return
+    
+    feedback_data = loads_json(legacy_path.read_bytes())
+    existing = Path(FEEDBACK_FILE).read_bytes() if Path(FEEDBACK_FILE).exists() else b""
+    
+    # Legacy entries predate the JSONL log, so they go first to keep it chronological.
+    # The combined log is swapped in before the legacy file is removed, so a crash never leaves half a log.
+    migrated = b"".join(dumps_json(feedback_entry) + b"\n" for feedback_entry in feedback_data)
+    write_bytes_atomic(FEEDBACK_FILE, migrated + existing)
+    legacy_path.unlink()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_feedback_count():
+    """Number of entries in the feedback log, or None if nothing was reported yet or it cannot be read."""
+    try:
+        with open(FEEDBACK_FILE, 'rb') as f:
+            return sum(1 for line in f if line.strip())
+    except OSError:
+        return None
+
 def log_audio_feedback(pair_id, word_type, issue_description):
-    """Log feedback about problematic audio files."""
+    """Append feedback about a problematic audio file to the feedback log."""
     try:
-        # Load existing feedback
-        feedback_data = []
-        if Path(FEEDBACK_FILE).exists():
-            with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
-                feedback_data = json.load(f)
-        
-        # Add new feedback entry
         feedback_entry = {
             "timestamp": datetime.now().isoformat(),
             "audio_file": f"{pair_id}_{word_type}.wav",
@@ -103,53 +399,102 @@ def log_audio_feedback(pair_id, word_type, issue_description):
             "word_type": word_type,
             "issue": issue_description
         }
-        feedback_data.append(feedback_entry)
         
-        # Save updated feedback
-        with open(FEEDBACK_FILE, 'w', encoding='utf-8') as f:
-            json.dump(feedback_data, f, indent=2, ensure_ascii=False)
+        with open(FEEDBACK_FILE, 'ab') as f:
+            f.write(dumps_json(feedback_entry) + b"\n")
+        get_feedback_count.clear()
         
         return True
     except Exception as e:
         st.error(f"Failed to log feedback: {e}")
         return False
 
+def prune_daily_stats(daily_stats, lifetime_stats):
+    """Move days older than the retention window out of daily_stats into lifetime totals."""
+    cutoff = (datetime.now() - timedelta(days=DAILY_STATS_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    
+    lifetime_stats = {
+        "questions_answered": lifetime_stats.get("questions_answered", 0),
+        "correct_answers": lifetime_stats.get("correct_answers", 0)
+    }
+    for date in [date for date in daily_stats if date < cutoff]:
+        stats = daily_stats.pop(date)
+        lifetime_stats["questions_answered"] += stats["questions_answered"]
+        lifetime_stats["correct_answers"] += stats["correct_answers"]
+    
+    return lifetime_stats
+
+def date_label(date_str):
+    """Short MM/DD display label for a YYYY-MM-DD key."""
+    return f"{date_str[5:7]}/{date_str[8:10]}"
+
+def build_daily_deque(daily_stats):
+    """Build the (date, label, stats) deque of the most recent 7 recorded days."""
+    return deque(
+        ((date_str, date_label(date_str), stats) for date_str, stats in sorted(daily_stats.items())[-7:]),
+        maxlen=7
+    )
+
+def get_date_keys():
+    """Today's date key and the first key of the 7-day window, computed once per script run."""
+    run_id = st.session_state.get("run_id", 0)
+    cached = st.session_state.get("_date_keys_cache")
+    if cached is not None and cached[0] == run_id:
+        return cached[1]
+    
+    today = datetime.now().date()
+    date_keys = (today.isoformat(), (today - timedelta(days=6)).isoformat())
+    st.session_state._date_keys_cache = (run_id, date_keys)
+    return date_keys
+
 def update_daily_stats(is_correct):
     """Update daily statistics."""
     if "daily_stats" not in st.session_state:
         st.session_state.daily_stats = {}
     
-    today = datetime.now().strftime("%Y-%m-%d")
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
     
     if today not in st.session_state.daily_stats:
         st.session_state.daily_stats[today] = {
             "questions_answered": 0,
             "correct_answers": 0,
-            "started_at": datetime.now().isoformat()
+            "started_at": now.isoformat()
         }
+        # The deque shares the dict, so later increments show up without another append
+        st.session_state.daily_deque.append((today, date_label(today), st.session_state.daily_stats[today]))
     
+    st.session_state._today_stats_cache = None
     st.session_state.daily_stats[today]["questions_answered"] += 1
     if is_correct:
         st.session_state.daily_stats[today]["correct_answers"] += 1
 
 def get_today_stats():
-    """Get today's statistics."""
+    """Get today's statistics, computed at most once per script run."""
     if "daily_stats" not in st.session_state:
         st.session_state.daily_stats = {}
     
-    today = datetime.now().strftime("%Y-%m-%d")
+    run_id = st.session_state.get("run_id", 0)
+    cached = st.session_state.get("_today_stats_cache")
+    if cached is not None and cached[0] == run_id:
+        return cached[1]
     
-    if today not in st.session_state.daily_stats:
-        return {"questions_answered": 0, "correct_answers": 0, "accuracy": 0}
+    today, _ = get_date_keys()
     
-    stats = st.session_state.daily_stats[today]
-    accuracy = int((stats["correct_answers"] / stats["questions_answered"]) * 100) if stats["questions_answered"] > 0 else 0
+    if today not in st.session_state.daily_stats:
+        today_stats = {"questions_answered": 0, "correct_answers": 0, "accuracy": 0}
+    else:
+        stats = st.session_state.daily_stats[today]
+        accuracy = int((stats["correct_answers"] / stats["questions_answered"]) * 100) if stats["questions_answered"] > 0 else 0
+        
+        today_stats = {
+            "questions_answered": stats["questions_answered"],
+            "correct_answers": stats["correct_answers"],
+            "accuracy": accuracy
+        }
     
-    return {
-        "questions_answered": stats["questions_answered"],
-        "correct_answers": stats["correct_answers"],
-        "accuracy": accuracy
-    }
+    st.session_state._today_stats_cache = (run_id, today_stats)
+    return today_stats
 
 def daily_target_reached():
     """Check if today's target has been reached."""
@@ -167,16 +512,30 @@ def get_current_target():
 
 def init_session_state():
     """Initialize all session state variables."""
-    if "df" not in st.session_state:
-        st.session_state.df = None
+    if "pairs" not in st.session_state:
+        st.session_state.pairs = None
     if "progress" not in st.session_state:
-        st.session_state.progress = {}
+        st.session_state.progress = resize_progress(None, 0)
+    if "outstanding" not in st.session_state:
+        st.session_state.outstanding = None  # Pairs still needing review, counted on first use
+    if "mastered_count" not in st.session_state:
+        st.session_state.mastered_count = None  # Pairs with a streak of 3+, counted on first use
+    if "type_stats" not in st.session_state:
+        st.session_state.type_stats = None  # Per-type mastered/learning counts, built on first use
+    if "due_heap" not in st.session_state:
+        st.session_state.due_heap = None  # (next_review, tiebreak, pair_id) entries, built on first use
+    if "_progress_dirty" not in st.session_state:
+        st.session_state._progress_dirty = set()
+    if "_last_progress_save" not in st.session_state:
+        st.session_state._last_progress_save = time.monotonic()
     if "current_pair_id" not in st.session_state:
         st.session_state.current_pair_id = None
     if "current_question" not in st.session_state:
         st.session_state.current_question = None
     if "user_answer" not in st.session_state:
         st.session_state.user_answer = None
+    if "pending_update" not in st.session_state:
+        st.session_state.pending_update = None  # Answer clicked but not yet scored
     if "session_correct" not in st.session_state:
         st.session_state.session_correct = 0
     if "session_total" not in st.session_state:
@@ -200,13 +559,20 @@ def init_session_state():
         st.session_state.feedback_target = None
     if "daily_stats" not in st.session_state:
         st.session_state.daily_stats = {}
+    if "daily_deque" not in st.session_state:
+        st.session_state.daily_deque = build_daily_deque(st.session_state.daily_stats)
+    if "lifetime_stats" not in st.session_state:
+        st.session_state.lifetime_stats = {}
     if "extra_questions_added" not in st.session_state:
         st.session_state.extra_questions_added = 0
+    if "run_id" not in st.session_state:
+        st.session_state.run_id = 0
 
 # ============================================================================
-# Audio Generation
+# Pair Data
 # ============================================================================
 
+@functools.lru_cache(maxsize=4096)
 def extract_first_word(text):
     """Extract the first word from comma/space/line-separated text."""
     if pd.isna(text):
@@ -219,60 +585,117 @@ def extract_first_word(text):
             return parts[0]
     return text.strip()
 
-def generate_audio_tts(text, output_path):
+@st.cache_resource(show_spinner=False)
+def load_pairs(path, mtime):
+    """Load the pairs CSV into per-column numpy arrays plus integer type codes.
+    
+    `mtime` is only part of the cache key: editing the CSV on disk changes it
+    and forces a re-parse, otherwise every session shares the same arrays.
+    Callers must treat the result as read-only.
+    """
+    df = pd.read_csv(path)
+    # Categories in order of first appearance, so the scoreboard keeps the CSV's type order;
+    # rows without a Type get code -1
+    types = pd.Categorical(df["Type"], categories=df["Type"].dropna().unique())
+    return {
+        "word1_kanji": df["Word1 Kanji"].fillna("").map(extract_first_word).to_numpy(),
+        "word2_kanji": df["Word2 Kanji"].fillna("").map(extract_first_word).to_numpy(),
+        "word1_kana": df["Word1 in Kana"].to_numpy(),
+        "word2_kana": df["Word2 in Kana"].to_numpy(),
+        "type": np.asarray(types),
+        "type_codes": types.codes.astype(np.intp),
+        "type_names": list(types.categories),
+        "n": len(df)
+    }
+
+# ============================================================================
+# Audio Generation
+# ============================================================================
+
+@st.cache_resource
+def audio_file_set():
+    """Names of the WAV files in AUDIO_DIR, listed once and cleared after generation."""
+    if not AUDIO_DIR.exists():
+        return set()
+    return {path.name for path in AUDIO_DIR.iterdir() if path.suffix == ".wav"}
+
+@st.cache_resource
+def audio_index():
+    """(pair_id, word_type) -> Path of every existing WAV file, built from the cached listing."""
+    index = {}
+    for name in audio_file_set():
+        pair_id, _, word_type = name.removesuffix(".wav").rpartition("_")
+        if pair_id.isdigit():
+            index[(int(pair_id), word_type)] = AUDIO_DIR / name
+    return index
+
+async def generate_audio_tts(client, text, output_path):
     """Generate audio using VOICEVOX TTS API."""
+    speaker_id = random.choice(SPEAKER_IDS)
+    
+    # Step 1: Text → Audio Query
+    query_resp = await client.post(
+        f"{TTS_BASE_URL}/audio_query",
+        params={"text": text, "speaker": speaker_id}
+    )
+    query_resp.raise_for_status()
+    query = loads_json(query_resp.content)
+    
+    # Step 2: Query → WAV file, streamed to a temporary file and renamed into place
+    # so an interrupted download never leaves a truncated WAV behind
+    tmp_path = output_path.with_suffix(".wav.tmp")
     try:
-        speaker_id = random.choice(SPEAKER_IDS)
-        
-        # Step 1: Text → Audio Query
-        query = requests.post(
-            f"{TTS_BASE_URL}/audio_query",
-            params={"text": text, "speaker": speaker_id},
-            timeout=10
-        ).json()
-        
-        # Step 2: Query → WAV file
-        wav = requests.post(
+        async with client.stream(
+            "POST",
             f"{TTS_BASE_URL}/synthesis",
             headers={"Content-Type": "application/json"},
             params={"speaker": speaker_id},
-            json=query,
-            timeout=10
-        )
+            content=dumps_json(query)
+        ) as wav:
+            wav.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                async for chunk in wav.aiter_bytes(64 * 1024):
+                    f.write(chunk)
         
-        with open(output_path, "wb") as f:
-            f.write(wav.content)
-        return True
-    except Exception as e:
-        st.error(f"TTS error for '{text}': {e}")
-        return False
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        # Also covers cancellation; don't leave the partial download in AUDIO_DIR
+        tmp_path.unlink(missing_ok=True)
+        raise
 
-def generate_single_audio(args):
-    """Generate a single audio file (for parallel processing)."""
+async def generate_single_audio(client, semaphore, args):
+    """Generate a single audio file, limited by the shared semaphore."""
     pair_id, word_type, text, output_path = args
-    try:
-        if generate_audio_tts(text, output_path):
+    async with semaphore:
+        try:
+            await generate_audio_tts(client, text, output_path)
             return (True, pair_id, word_type)
-        else:
-            return (False, pair_id, word_type)
-    except Exception as e:
-        return (False, pair_id, word_type, str(e))
+        except Exception as e:
+            return (False, pair_id, word_type, f"TTS error for '{text}': {e}")
+
+async def generate_audio_batch(tasks, on_result):
+    """Run all TTS tasks concurrently over one pooled async HTTP client."""
+    semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+    limits = httpx.Limits(max_connections=TTS_CONCURRENCY * 2)
+    
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        jobs = [generate_single_audio(client, semaphore, task) for task in tasks]
+        for job in asyncio.as_completed(jobs):
+            on_result(await job)
 
-def generate_all_audio(df):
+def generate_all_audio(pairs):
     """Generate missing audio files for all pairs with parallel processing."""
     AUDIO_DIR.mkdir(exist_ok=True)
     
-    total_files = len(df) * 2
+    total_files = pairs["n"] * 2
     missing_files = []
     
-    # Check what's missing
-    for i in range(len(df)):
-        path_a = AUDIO_DIR / f"{i}_A.wav"
-        path_b = AUDIO_DIR / f"{i}_B.wav"
-        if not path_a.exists():
-            missing_files.append((i, 'A'))
-        if not path_b.exists():
-            missing_files.append((i, 'B'))
+    # Check what's missing with a single directory listing
+    existing_files = audio_file_set()
+    for i in range(pairs["n"]):
+        for word_type in ('A', 'B'):
+            if f"{i}_{word_type}.wav" not in existing_files:
+                missing_files.append((i, word_type))
     
     if not missing_files:
         st.success(f"✓ All {total_files} audio files exist")
@@ -285,39 +708,38 @@ def generate_all_audio(df):
     # Prepare tasks for parallel processing
     tasks = []
     for pair_id, word_type in missing_files:
-        row = df.iloc[pair_id]
-        
         if word_type == 'A':
-            text = extract_first_word(row["Word1 Kanji"])
+            text = pairs["word1_kanji"][pair_id]
             output_path = AUDIO_DIR / f"{pair_id}_A.wav"
         else:
-            text = extract_first_word(row["Word2 Kanji"])
+            text = pairs["word2_kanji"][pair_id]
             output_path = AUDIO_DIR / f"{pair_id}_B.wav"
         
         tasks.append((pair_id, word_type, text, output_path))
     
-    # Process in parallel with ThreadPoolExecutor
+    # Process concurrently on an asyncio event loop
     completed = 0
     failed = []
     
-    with ThreadPoolExecutor(max_workers=8) as executor:
-        futures = {executor.submit(generate_single_audio, task): task for task in tasks}
+    def on_result(result):
+        nonlocal completed
+        completed += 1
         
-        for future in as_completed(futures):
-            result = future.result()
-            completed += 1
-            
-            if not result[0]:
-                failed.append(result[1:])
-            
-            # Update progress
-            progress_bar.progress(completed / len(missing_files))
-            status_text.text(f"Generated {completed} / {len(missing_files)} files...")
+        if not result[0]:
+            failed.append(result[1:])
+        
+        # Update progress
+        progress_bar.progress(completed / len(missing_files))
+        status_text.text(f"Generated {completed} / {len(missing_files)} files...")
+    
+    asyncio.run(generate_audio_batch(tasks, on_result))
+    audio_file_set.clear()
+    audio_index.clear()
     
     status_text.empty()
     
     if failed:
-        st.error(f"Failed to generate {len(failed)} audio files")
+        st.error(f"Failed to generate {len(failed)} audio files ({failed[0][2]})")
         return False
     
     st.success(f"✓ Generated {len(missing_files)} audio files")
@@ -327,21 +749,56 @@ def generate_all_audio(df):
 # SRS Logic (SM-2 inspired)
 # ============================================================================
 
-def init_pair_progress(pair_id):
-    """Initialize progress for a pair if not exists."""
-    if pair_id not in st.session_state.progress:
-        st.session_state.progress[pair_id] = {
-            "correct_streak": 0,
-            "ease_factor": 2.5,
-            "interval_days": 0,
-            "next_review": datetime.now(),
-            "ever_correct": False
+def is_outstanding(progress, now_ts):
+    """Whether a pair still needs review: never answered correctly, or due."""
+    return not progress["ever_correct"] or progress["next_review"] <= now_ts
+
+def count_outstanding(now_ts):
+    """Count pairs that still need review."""
+    progress = st.session_state.progress
+    return int((~progress["ever_correct"] | (progress["next_review"] <= now_ts)).sum())
+
+def get_mastered_count():
+    """Number of mastered pairs (streak of 3+), kept up to date by update_progress."""
+    if st.session_state.mastered_count is None:
+        st.session_state.mastered_count = int((st.session_state.progress["correct_streak"] >= 3).sum())
+    return st.session_state.mastered_count
+
+def get_type_stats(pairs):
+    """Per-type mastered/learning/total counts, kept up to date by update_progress."""
+    if st.session_state.type_stats is None:
+        progress = st.session_state.progress
+        mastered_mask = progress["correct_streak"] >= 3
+        learning_mask = progress["ever_correct"] & ~mastered_mask
+        
+        # One bincount per measure counts every type at once; pairs without a type (code -1) are left out
+        codes = pairs["type_codes"]
+        typed_mask = codes >= 0
+        n_types = len(pairs["type_names"])
+        mastered = np.bincount(codes[mastered_mask & typed_mask], minlength=n_types)
+        learning = np.bincount(codes[learning_mask & typed_mask], minlength=n_types)
+        total = np.bincount(codes[typed_mask], minlength=n_types)
+        
+        st.session_state.type_stats = {
+            type_name: {
+                "mastered": int(mastered[code]),
+                "learning": int(learning[code]),
+                "total": int(total[code])
+            }
+            for code, type_name in enumerate(pairs["type_names"])
         }
+    return st.session_state.type_stats
 
 def update_progress(pair_id, is_correct):
     """Update SRS progress after answer."""
-    init_pair_progress(pair_id)
-    progress = st.session_state.progress[pair_id]
+    if pair_id >= len(st.session_state.progress["correct_streak"]):
+        bulk_init_progress(pair_id + 1)
+    
+    progress = get_progress(pair_id)
+    now_ts = _now_ts()
+    was_outstanding = is_outstanding(progress, now_ts)
+    was_mastered = progress["correct_streak"] >= 3
+    was_learning = progress["ever_correct"] and not was_mastered
     
     if is_correct:
         progress["correct_streak"] += 1
@@ -357,94 +814,140 @@ def update_progress(pair_id, is_correct):
         
         # Use minutes for intervals < 1 day, otherwise days
         if interval < 1:
-            progress["next_review"] = datetime.now() + timedelta(minutes=max(1, int(interval * 1440)))
+            progress["next_review"] = now_ts + timedelta(minutes=max(1, int(interval * 1440))).total_seconds()
         else:
-            progress["next_review"] = datetime.now() + timedelta(days=interval)
+            progress["next_review"] = now_ts + timedelta(days=interval).total_seconds()
     else:
         progress["correct_streak"] = 0
         progress["interval_days"] = 0
-        progress["next_review"] = datetime.now()
-    
-    # Auto-save progress after each answer
-    save_progress()
+        progress["next_review"] = now_ts
+    
+    set_progress(pair_id, **progress)
+    
+    if st.session_state.due_heap is not None:
+        heapq.heappush(st.session_state.due_heap, (progress["next_review"], random.random(), pair_id))
+    
+    if st.session_state.outstanding is not None:
+        st.session_state.outstanding += int(is_outstanding(progress, now_ts)) - int(was_outstanding)
+    if st.session_state.mastered_count is not None:
+        st.session_state.mastered_count += int(progress["correct_streak"] >= 3) - int(was_mastered)
+    if st.session_state.type_stats is not None and st.session_state.pairs["type_codes"][pair_id] >= 0:
+        is_mastered = progress["correct_streak"] >= 3
+        type_stats = st.session_state.type_stats[st.session_state.pairs["type"][pair_id]]
+        type_stats["mastered"] += int(is_mastered) - int(was_mastered)
+        type_stats["learning"] += int(progress["ever_correct"] and not is_mastered) - int(was_learning)
+    
+    # Log the changed pair now; the full progress file is rewritten in batches
+    st.session_state._progress_dirty.add(pair_id)
+    append_progress_log(pair_id)
+    schedule_save()
 
-def select_next_pair(df):
-    """Select the pair with earliest next_review that's due, shuffled by type to avoid sequential order."""
-    due_pairs = []
-    now = datetime.now()
+def apply_pending_answer():
+    """Score the answer clicked on the previous run, exactly once."""
+    position = st.session_state.pending_update
+    if position is None:
+        return
+    st.session_state.pending_update = None
     
-    for pair_id in range(len(df)):
-        init_pair_progress(pair_id)
-        progress = st.session_state.progress[pair_id]
-        if progress["next_review"] <= now:
-            type_name = df.iloc[pair_id]["Type"]
-            due_pairs.append((pair_id, progress["next_review"], type_name))
+    question = st.session_state.current_question
+    st.session_state.session_total += 1
     
-    if not due_pairs:
-        return None
+    is_correct = (position == question["correct_position"])
+    if is_correct:
+        st.session_state.session_correct += 1
+        st.session_state.current_streak += 1
+    else:
+        st.session_state.current_streak = 0
     
-    # Sort by next_review first
-    due_pairs.sort(key=lambda x: x[1])
+    update_daily_stats(is_correct)
+    update_progress(question["pair_id"], is_correct)
+
+def get_due_heap():
+    """Heap of (next_review, tiebreak, pair_id), kept up to date by update_progress.
+    
+    Entries whose timestamp no longer matches the progress arrays are stale and
+    skipped when popped. The random tiebreak shuffles pairs due at the same time.
+    """
+    if st.session_state.due_heap is None:
+        heap = [
+            (next_review, random.random(), pair_id)
+            for pair_id, next_review in enumerate(st.session_state.progress["next_review"].tolist())
+        ]
+        heapq.heapify(heap)
+        st.session_state.due_heap = heap
+    return st.session_state.due_heap
+
+def select_next_pair(pairs, now_ts):
+    """Select the pair with earliest next_review that's due, shuffled by type to avoid sequential order."""
+    heap = get_due_heap()
+    next_review_ts = st.session_state.progress["next_review"]
+    
+    # Pop a handful of the most urgent pairs (within a small time window) and shuffle them by type
+    time_window = timedelta(minutes=5).total_seconds()  # Consider pairs due within 5 minutes as equally urgent
+    candidates = []
+    while heap and len(candidates) < SELECT_CANDIDATES:
+        ts, tiebreak, pair_id = heap[0]
+        if next_review_ts[pair_id] != ts:
+            heapq.heappop(heap)  # Stale entry, the pair was rescheduled
+            continue
+        if ts > now_ts or (candidates and ts > candidates[0][0] + time_window):
+            break
+        candidates.append(heapq.heappop(heap))
+    
+    if not candidates:
+        return None
     
-    # Take the most urgent pairs (within a small time window) and shuffle them by type
-    earliest_time = due_pairs[0][1]
-    time_window = timedelta(minutes=5)  # Consider pairs due within 5 minutes as equally urgent
+    # If there are multiple urgent pairs, prefer different type from last shown
+    choices = candidates
+    if len(candidates) > 1 and "last_shown_type" in st.session_state:
+        different_type = [entry for entry in candidates if pairs["type"][entry[2]] != st.session_state.last_shown_type]
+        if different_type:
+            choices = different_type
     
-    urgent_pairs = [p for p in due_pairs if p[1] <= earliest_time + time_window]
+    # All candidates go back; the chosen pair's entry turns stale once it is answered
+    for entry in candidates:
+        heapq.heappush(heap, entry)
     
-    # If there are multiple urgent pairs, prefer different type from last shown
-    if len(urgent_pairs) > 1 and hasattr(st.session_state, 'last_shown_type'):
-        # Try to find a pair with different type
-        different_type_pairs = [p for p in urgent_pairs if p[2] != st.session_state.last_shown_type]
-        if different_type_pairs:
-            selected = random.choice(different_type_pairs)
-        else:
-            selected = random.choice(urgent_pairs)
-    else:
-        selected = random.choice(urgent_pairs) if len(urgent_pairs) > 1 else urgent_pairs[0]
+    selected = random.choice(choices)[2]
     
     # Remember the type we just showed
-    st.session_state.last_shown_type = selected[2]
+    st.session_state.last_shown_type = pairs["type"][selected]
     
-    return selected[0]
+    return selected
 
-def session_complete(df):
+def session_complete(pairs, now_ts):
     """Check if session is complete: daily target reached or all pairs reviewed."""
     # Check if daily target reached
     if daily_target_reached():
         return True
     
-    # Otherwise check if all pairs answered correctly and not due
-    now = datetime.now()
-    for pair_id in range(len(df)):
-        init_pair_progress(pair_id)
-        progress = st.session_state.progress[pair_id]
-        if not progress["ever_correct"] or progress["next_review"] <= now:
-            return False
-    return True
+    # Otherwise check if all pairs answered correctly and not due. The running
+    # counter never overestimates (pairs whose interval lapses are not added back),
+    # so a positive count is trusted and only a count of 0 is recounted.
+    if not st.session_state.outstanding:
+        st.session_state.outstanding = count_outstanding(now_ts)
+    return st.session_state.outstanding == 0
 
 # ============================================================================
 # Question Generation
 # ============================================================================
 
-def create_question(pair_id, df):
+# Every odd-one-out layout: (sequence, correct position (1-indexed), majority, odd).
+# 3 majority + 1 odd at each of the 4 positions, for both choices of majority word.
+QUESTION_LAYOUTS = tuple(
+    (
+        tuple(odd if i == odd_index else majority for i in range(4)),
+        odd_index + 1,
+        majority,
+        odd
+    )
+    for majority, odd in (('A', 'B'), ('B', 'A'))
+    for odd_index in range(4)
+)
+
+def create_question(pair_id, pairs):
     """Create an odd-one-out question for a pair."""
-    row = df.iloc[pair_id]
-    
-    # Randomly choose which word is majority (3x) and which is odd (1x)
-    if random.random() < 0.5:
-        majority = 'A'
-        odd = 'B'
-    else:
-        majority = 'B'
-        odd = 'A'
-    
-    # Create sequence: 3 majority + 1 odd
-    sequence = [majority, majority, majority, odd]
-    random.shuffle(sequence)
-    
-    # Find correct answer position (1-indexed)
-    correct_position = sequence.index(odd) + 1
+    sequence, correct_position, majority, odd = QUESTION_LAYOUTS[random.randrange(len(QUESTION_LAYOUTS))]
     
     return {
         "pair_id": pair_id,
@@ -452,96 +955,133 @@ def create_question(pair_id, df):
         "correct_position": correct_position,
         "majority": majority,
         "odd": odd,
-        "word1_kana": row["Word1 in Kana"],
-        "word1_kanji": extract_first_word(row["Word1 Kanji"]),
-        "word2_kana": row["Word2 in Kana"],
-        "word2_kanji": extract_first_word(row["Word2 Kanji"]),
-        "type": row["Type"]
+        "word1_kana": pairs["word1_kana"][pair_id],
+        "word1_kanji": pairs["word1_kanji"][pair_id],
+        "word2_kana": pairs["word2_kana"][pair_id],
+        "word2_kanji": pairs["word2_kanji"][pair_id],
+        "type": pairs["type"][pair_id]
     }
 
 # ============================================================================
 # Statistics
 # ============================================================================
 
-def get_statistics(df):
-    """Calculate statistics by type."""
+def get_statistics(pairs):
+    """Build the per-type statistics table from the incrementally maintained counts."""
     stats = []
     
-    for type_name in df["Type"].unique():
-        type_pairs = df[df["Type"] == type_name].index.tolist()
-        
-        mastered = 0
-        learning = 0
-        
-        for pair_id in type_pairs:
-            init_pair_progress(pair_id)
-            progress = st.session_state.progress[pair_id]
-            
-            if progress["correct_streak"] >= 3:
-                mastered += 1
-            elif progress["ever_correct"]:
-                learning += 1
-        
-        total = len(type_pairs)
-        progress_pct = int((mastered / total) * 100) if total > 0 else 0
+    for type_name, counts in get_type_stats(pairs).items():
+        total = counts["total"]
+        progress_pct = int((counts["mastered"] / total) * 100) if total > 0 else 0
         
         stats.append({
             "Type": type_name,
-            "Mastered": mastered,
-            "Learning": learning,
+            "Mastered": counts["mastered"],
+            "Learning": counts["learning"],
             "Total": total,
             "Progress": progress_pct
         })
     
     return pd.DataFrame(stats).sort_values("Progress", ascending=False)
 
+def get_last_7_days(daily_deque):
+    """Build the last-7-days summary table from the recent-days deque."""
+    _, cutoff = get_date_keys()
+    
+    rows = []
+    for date_str, label, stats in daily_deque:
+        if date_str < cutoff:
+            continue
+        questions = stats["questions_answered"]
+        correct = stats["correct_answers"]
+        rows.append({
+            "Date": label,
+            "Questions": questions,
+            "Correct": correct,
+            "Accuracy": f"{int(correct / questions * 100) if questions > 0 else 0}%"
+        })
+    
+    return pd.DataFrame(rows)
+
 # ============================================================================
 # UI Components
 # ============================================================================
 
-def render_top_bar(df):
+# Stylesheet served from static/ (see .streamlit/config.toml); runs only send this
+# short tag and the browser caches the CSS itself
+APP_CSS_LINK = '<link rel="stylesheet" href="app/static/app.css">'
+
+# Four equal columns, used for HTML rows that line up with st.columns(4)
+TILE_GRID_STYLE = "display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem;"
+
+# Progress percentage buckets for the scoreboard: <30, 30-49, 50-69, 70-89, 90+
+PROGRESS_EMOJI_BINS = [-1, 29, 49, 69, 89, 100]
+PROGRESS_EMOJI_LABELS = ["🌱", "💚", "🎧", "🎵", "🌟"]
+
+def render_top_bar(pairs):
     """Render global progress bar."""
-    total_pairs = len(df)
-    mastered = sum(1 for i in range(total_pairs) 
-                   if st.session_state.progress.get(i, {}).get("correct_streak", 0) >= 3)
+    total_pairs = pairs["n"]
+    mastered = get_mastered_count()
     
     progress = mastered / total_pairs if total_pairs > 0 else 0
     st.progress(progress)
     st.caption(f"Total Mastery: {mastered} / {total_pairs} pairs")
 
+# Button callbacks run before the rerun the click triggers, so the practice
+# fragment re-renders once with the new state instead of calling st.rerun()
+
+def choose_answer(position):
+    """Record the clicked answer; it is scored at the start of the next run."""
+    st.session_state.user_answer = position
+    st.session_state.pending_update = position
+
+def open_feedback_form(pair_id, word_type):
+    """Show the feedback form for one audio file."""
+    st.session_state.show_feedback_form = True
+    st.session_state.feedback_target = (pair_id, word_type)
+
+def close_feedback_form():
+    """Hide the feedback form."""
+    st.session_state.show_feedback_form = False
+    st.session_state.feedback_target = None
+
+def next_question():
+    """Clear the answered question so a new one is picked."""
+    st.session_state.user_answer = None
+    st.session_state.current_question = None
+    st.session_state.current_pair_id = None
+
 def render_audio_player(position, word_type, pair_id):
     """Render a large numbered audio player button."""
-    audio_path = AUDIO_DIR / f"{pair_id}_{word_type}.wav"
+    audio_path = audio_index().get((pair_id, word_type))
     
-    if audio_path.exists():
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-        st.audio(audio_bytes, format="audio/wav")
+    if audio_path is not None:
+        st.audio(str(audio_path), format="audio/wav")
     else:
-        st.error(f"Audio file missing: {audio_path}")
+        st.error(f"Audio file missing: {AUDIO_DIR / f'{pair_id}_{word_type}.wav'}")
 
 def render_audio_player_with_feedback(position, word_type, pair_id, show_feedback_btn=False):
     """Render audio player with optional feedback button."""
-    audio_path = AUDIO_DIR / f"{pair_id}_{word_type}.wav"
+    audio_path = audio_index().get((pair_id, word_type))
     
-    if audio_path.exists():
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-        st.audio(audio_bytes, format="audio/wav")
+    if audio_path is not None:
+        st.audio(str(audio_path), format="audio/wav")
         
         if show_feedback_btn:
-            if st.button(f"🚩 Report Issue", key=f"feedback_{pair_id}_{word_type}_{position}", use_container_width=True):
-                st.session_state.show_feedback_form = True
-                st.session_state.feedback_target = (pair_id, word_type)
-                st.rerun()
+            st.button(f"🚩 Report Issue", key=f"feedback_{pair_id}_{word_type}_{position}", use_container_width=True,
+                      on_click=open_feedback_form, args=(pair_id, word_type))
     else:
-        st.error(f"Audio file missing: {audio_path}")
+        st.error(f"Audio file missing: {AUDIO_DIR / f'{pair_id}_{word_type}.wav'}")
 
 def render_question_ui(question):
     """Render the blind question interface."""
     st.markdown("### 🎧 Which one sounded different?")
     st.markdown("---")
     
+    # Position numbers are emitted as one grid instead of one markdown element per column
+    numbers_html = "".join(f"<h1 style='text-align: center;'>{position}</h1>" for position in range(1, 5))
+    st.markdown(f"<div style='{TILE_GRID_STYLE}'>{numbers_html}</div>", unsafe_allow_html=True)
+    
     # Create 4 columns for the buttons
     cols = st.columns(4)
     
@@ -550,25 +1090,10 @@ def render_question_ui(question):
             position = i + 1
             word_type = question["sequence"][i]
             
-            st.markdown(f"<h1 style='text-align: center;'>{position}</h1>", 
-                       unsafe_allow_html=True)
             render_audio_player(position, word_type, question["pair_id"])
             
-            if st.button(f"Select {position}", key=f"btn_{position}", 
-                        use_container_width=True):
-                st.session_state.user_answer = position
-                st.session_state.session_total += 1
-                
-                is_correct = (position == question["correct_position"])
-                if is_correct:
-                    st.session_state.session_correct += 1
-                    st.session_state.current_streak += 1
-                else:
-                    st.session_state.current_streak = 0
-                
-                update_progress(question["pair_id"], is_correct)
-                update_daily_stats(is_correct)
-                st.rerun()
+            st.button(f"Select {position}", key=f"btn_{position}", 
+                      use_container_width=True, on_click=choose_answer, args=(position,))
 
 def render_feedback_ui(question):
     """Render answer feedback."""
@@ -584,41 +1109,47 @@ def render_feedback_ui(question):
     
     st.markdown("---")
     
-    # Show the 4 positions with highlighting
+    # Show the 4 positions with highlighting, emitted as a single markdown element
+    tiles_html = []
+    for i, word_type in enumerate(question["sequence"]):
+        position = i + 1
+        
+        # Determine which word this is
+        if word_type == 'A':
+            word_kana = question['word1_kana']
+            word_kanji = question['word1_kanji']
+        else:
+            word_kana = question['word2_kana']
+            word_kanji = question['word2_kanji']
+        
+        # Color coding
+        if position == correct_pos:
+            bg_color = "#90EE90"  # Light green
+            label = f"{position} ✓"
+        elif position == user_pos:
+            bg_color = "#FFB6C6"  # Light red
+            label = f"{position} ✗"
+        else:
+            bg_color = "#F0F0F0"
+            label = str(position)
+        
+        tiles_html.append(
+            f"<div style='background-color: {bg_color}; padding: 20px; "
+            f"border-radius: 10px; text-align: center; margin-bottom: 10px;'>"
+            f"<h2>{label}</h2>"
+            f"<p style='margin: 5px 0; font-size: 14px;'>{word_kana}</p>"
+            f"<p style='margin: 0; font-size: 12px; color: #666;'>({word_kanji})</p>"
+            f"</div>"
+        )
+    
+    st.markdown(f"<div style='{TILE_GRID_STYLE}'>{''.join(tiles_html)}</div>", unsafe_allow_html=True)
+    
+    # Audio players need real widgets, so they keep their own columns
     cols = st.columns(4)
     for i, col in enumerate(cols):
         with col:
             position = i + 1
             word_type = question["sequence"][i]
-            
-            # Determine which word this is
-            if word_type == 'A':
-                word_kana = question['word1_kana']
-                word_kanji = question['word1_kanji']
-            else:
-                word_kana = question['word2_kana']
-                word_kanji = question['word2_kanji']
-            
-            # Color coding
-            if position == correct_pos:
-                bg_color = "#90EE90"  # Light green
-                label = f"{position} ✓"
-            elif position == user_pos:
-                bg_color = "#FFB6C6"  # Light red
-                label = f"{position} ✗"
-            else:
-                bg_color = "#F0F0F0"
-                label = str(position)
-            
-            st.markdown(f"""
-                <div style='background-color: {bg_color}; padding: 20px; 
-                     border-radius: 10px; text-align: center; margin-bottom: 10px;'>
-                    <h2>{label}</h2>
-                    <p style='margin: 5px 0; font-size: 14px;'>{word_kana}</p>
-                    <p style='margin: 0; font-size: 12px; color: #666;'>({word_kanji})</p>
-                </div>
-            """, unsafe_allow_html=True)
-            
             render_audio_player_with_feedback(position, word_type, question["pair_id"], show_feedback_btn=True)
     
     st.markdown("---")
@@ -663,50 +1194,33 @@ def render_feedback_ui(question):
                     st.rerun()
         
         with col2:
-            if st.button("Cancel", use_container_width=True):
-                st.session_state.show_feedback_form = False
-                st.session_state.feedback_target = None
-                st.rerun()
+            st.button("Cancel", use_container_width=True, on_click=close_feedback_form)
     
     # Next button
-    if st.button("Next Question ➜", type="primary", use_container_width=True):
-        st.session_state.user_answer = None
-        st.session_state.current_question = None
-        st.session_state.current_pair_id = None
-        save_progress()  # Ensure progress is saved before moving to next question
-        st.rerun()
+    st.button("Next Question ➜", type="primary", use_container_width=True, on_click=next_question)
 
-def render_scoreboard(df):
+def render_scoreboard(pairs):
     """Render live statistics table."""
     st.markdown("### 📊 Progress by Type")
     
-    stats_df = get_statistics(df)
+    stats_df = get_statistics(pairs)
     
     # Format the display
     display_df = stats_df.copy()
     
-    # Add cute emoji-based progress indicator
-    def progress_emoji(pct):
-        # Use single emoji to represent progress level
-        if pct >= 90:
-            return f"🌟 {pct}%"
-        elif pct >= 70:
-            return f"🎵 {pct}%"
-        elif pct >= 50:
-            return f"🎧 {pct}%"
-        elif pct >= 30:
-            return f"💚 {pct}%"
-        else:
-            return f"🌱 {pct}%"
-    
-    display_df["Progress"] = display_df["Progress"].apply(progress_emoji)
+    # Add cute emoji-based progress indicator, bucketed in one vectorized pass
+    emoji = pd.cut(
+        display_df["Progress"],
+        bins=PROGRESS_EMOJI_BINS,
+        labels=PROGRESS_EMOJI_LABELS
+    ).astype(str)
+    display_df["Progress"] = emoji + " " + display_df["Progress"].astype(str) + "%"
     
     st.dataframe(display_df, use_container_width=True, hide_index=True)
     
     # Overall stats
-    total_pairs = len(df)
-    total_mastered = sum(1 for i in range(total_pairs) 
-                         if st.session_state.progress.get(i, {}).get("correct_streak", 0) >= 3)
+    total_pairs = pairs["n"]
+    total_mastered = get_mastered_count()
     
     st.markdown(f"**Total mastery: {total_mastered} / {total_pairs} pairs**")
 
@@ -750,26 +1264,14 @@ def render_daily_dashboard():
         st.info(f"💪 {remaining} more questions to reach today's target!")
     
     # Last 7 days summary
-    if len(st.session_state.daily_stats) > 1:
+    if len(st.session_state.daily_deque) > 1:
         st.markdown("#### 📊 Last 7 Days")
         
-        # Get last 7 days of data
-        last_7_days = []
-        for i in range(6, -1, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-            if date in st.session_state.daily_stats:
-                stats = st.session_state.daily_stats[date]
-                last_7_days.append({
-                    "Date": datetime.strptime(date, "%Y-%m-%d").strftime("%m/%d"),
-                    "Questions": stats["questions_answered"],
-                    "Correct": stats["correct_answers"],
-                    "Accuracy": f"{int((stats['correct_answers'] / stats['questions_answered']) * 100)}%" if stats["questions_answered"] > 0 else "0%"
-                })
-        
-        if last_7_days:
-            st.dataframe(pd.DataFrame(last_7_days), use_container_width=True, hide_index=True)
-
-def render_session_complete_ui(df):
+        last_7_days = get_last_7_days(st.session_state.daily_deque)
+        if not last_7_days.empty:
+            st.dataframe(last_7_days, use_container_width=True, hide_index=True)
+
+def render_session_complete_ui(pairs):
     """Render session complete screen."""
     st.balloons()
     
@@ -800,13 +1302,13 @@ def render_session_complete_ui(df):
                 st.session_state.user_answer = None
                 st.session_state.current_question = None
                 st.session_state.current_pair_id = None
-                save_progress()
+                compact_progress()
                 st.rerun()
         
         with col2:
             if st.button("✓ Finish for Today", use_container_width=True):
                 st.success("See you tomorrow! 👋")
-                save_progress()
+                compact_progress()
         
         # Show extra questions info if any were added
         if st.session_state.extra_questions_added > 0:
@@ -820,19 +1322,63 @@ def render_session_complete_ui(df):
         with col1:
             if st.button("Continue Practice", type="primary", use_container_width=True):
                 # Reset some pairs to make them due
-                for i in range(min(5, len(df))):
-                    if i in st.session_state.progress:
-                        st.session_state.progress[i]["next_review"] = datetime.now()
+                st.session_state.progress["next_review"][:5] = _now_ts()
+                st.session_state.due_heap = None
                 st.rerun()
         
         with col2:
             if st.button("Finish for Today", use_container_width=True):
                 st.success("See you tomorrow! 👋")
-                save_progress()
+                compact_progress()
     
     st.markdown("---")
     
-    render_scoreboard(df)
+    render_scoreboard(pairs)
+
+def begin_fragment_run():
+    """Start a new run for the per-run caches when a fragment reruns on its own, outside main()."""
+    if not st.session_state.get("_main_running", False):
+        st.session_state.run_id += 1
+
+@st.fragment(run_every=SIDEBAR_REFRESH_SECONDS)
+def render_sidebar_stats(pairs):
+    """Render the sidebar dashboard and scoreboard, refreshed on a timer rather than on every answer."""
+    begin_fragment_run()
+    st.markdown("---")
+    render_daily_dashboard()
+    st.markdown("---")
+    render_scoreboard(pairs)
+
+@st.fragment
+def render_practice_area(pairs):
+    """Render the main question/feedback area; answering only reruns this fragment."""
+    # Fragment reruns skip main(), so score a pending answer here as well
+    begin_fragment_run()
+    apply_pending_answer()
+    
+    # One timestamp for all due-date checks in this run
+    now_ts = _now_ts()
+    if session_complete(pairs, now_ts):
+        if st.session_state._progress_dirty:
+            compact_progress()
+        render_session_complete_ui(pairs)
+    elif st.session_state.user_answer is not None:
+        # Show feedback
+        render_feedback_ui(st.session_state.current_question)
+    else:
+        # Generate new question if needed
+        if st.session_state.current_question is None:
+            next_pair_id = select_next_pair(pairs, now_ts)
+            
+            if next_pair_id is None:
+                render_session_complete_ui(pairs)
+            else:
+                st.session_state.current_pair_id = next_pair_id
+                st.session_state.current_question = create_question(next_pair_id, pairs)
+        
+        # Show question
+        if st.session_state.current_question:
+            render_question_ui(st.session_state.current_question)
 
 # ============================================================================
 # Main App
@@ -845,44 +1391,36 @@ def main():
         layout="wide"
     )
     
-    # Custom CSS for minimalist Japanese design
-    st.markdown("""
-        <style>
-        .stApp {
-            background-color: #FAFAFA;
-        }
-        h1, h2, h3 {
-            color: #2C3E50;
-            font-weight: 300;
-        }
-        .stButton>button {
-            background-color: #3498DB;
-            color: white;
-            border: none;
-            border-radius: 5px;
-            padding: 10px 20px;
-            font-size: 16px;
-        }
-        .stButton>button:hover {
-            background-color: #2980B9;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    # Custom CSS for minimalist Japanese design (colors live in .streamlit/config.toml)
+    st.markdown(APP_CSS_LINK, unsafe_allow_html=True)
     
     st.title("🎧 Japanese Minimal Pairs Practice")
     st.caption("Blind listening practice using the odd-one-out method")
     
     init_session_state()
+    st.session_state.run_id += 1  # Keys per-run caches such as get_today_stats()
+    st.session_state._main_running = True  # Fragments rendered by this run share its run_id
+    start_progress_flushers()
+    try:
+        migrate_feedback_file()
+    except (ValueError, OSError) as e:
+        st.error(f"Failed to migrate {LEGACY_FEEDBACK_FILE}: {e}")
     
     # Load CSV
-    if st.session_state.df is None:
+    if st.session_state.pairs is None:
         try:
-            st.session_state.df = pd.read_csv(CSV_FILE)
+            st.session_state.pairs = load_pairs(CSV_FILE, os.path.getmtime(CSV_FILE))
+            bulk_init_progress(st.session_state.pairs["n"])
             st.session_state.show_csv_loaded_msg = True
         except Exception as e:
             st.error(f"Failed to load {CSV_FILE}: {e}")
             st.stop()
     
+    # Score a just-clicked answer before the sidebar reads the counters
+    apply_pending_answer()
+    # Report a background save that failed since the last run
+    collect_background_save()
+    
     # Show dismissible success messages
     if st.session_state.get("show_progress_loaded_msg", False):
         col1, col2 = st.columns([6, 1])
@@ -896,20 +1434,24 @@ def main():
     if st.session_state.get("show_csv_loaded_msg", False):
         col1, col2 = st.columns([6, 1])
         with col1:
-            st.success(f"✓ Loaded {len(st.session_state.df)} pairs")
+            st.success(f"✓ Loaded {st.session_state.pairs['n']} pairs")
         with col2:
             if st.button("✕", key="close_csv_msg"):
                 st.session_state.show_csv_loaded_msg = False
                 st.rerun()
     
-    df = st.session_state.df
+    pairs = st.session_state.pairs
     
     # Sidebar controls
     with st.sidebar:
         st.markdown("## 🎛️ Controls")
         
         if st.button("🔄 Restart Session", use_container_width=True):
-            st.session_state.progress = {}
+            st.session_state.progress = resize_progress(None, pairs["n"])
+            st.session_state.outstanding = None
+            st.session_state.mastered_count = None
+            st.session_state.type_stats = None
+            st.session_state.due_heap = None
             st.session_state.current_pair_id = None
             st.session_state.current_question = None
             st.session_state.user_answer = None
@@ -917,13 +1459,13 @@ def main():
             st.session_state.session_total = 0
             st.session_state.current_streak = 0
             st.session_state.extra_questions_added = 0
-            save_progress()
+            compact_progress()
             st.rerun()
         
         col1, col2 = st.columns(2)
         with col1:
             if st.button("💾 Save", use_container_width=True):
-                if save_progress():
+                if compact_progress():
                     st.success("Saved!")
         
         with col2:
@@ -934,49 +1476,27 @@ def main():
         
         with st.expander("🔧 Audio Management"):
             if st.button("Regenerate Missing Audio"):
-                generate_all_audio(df)
+                generate_all_audio(pairs)
             
             # Show feedback log count
-            if Path(FEEDBACK_FILE).exists():
-                try:
-                    with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
-                        feedback_data = json.load(f)
-                    st.caption(f"📝 {len(feedback_data)} audio issues reported")
-                except:
-                    pass
+            feedback_count = get_feedback_count()
+            if feedback_count is not None:
+                st.caption(f"📝 {feedback_count} audio issues reported")
         
-        st.markdown("---")
-        render_daily_dashboard()
-        st.markdown("---")
-        render_scoreboard(df)
+        render_sidebar_stats(pairs)
     
-    # Generate audio on first run
-    if not AUDIO_DIR.exists() or len(list(AUDIO_DIR.glob("*.wav"))) < len(df) * 2:
+    # Generate audio on first run (the cached listing is refreshed after each generation)
+    if len(audio_file_set()) < pairs["n"] * 2:
         with st.spinner("Checking audio files..."):
-            generate_all_audio(df)
+            generate_all_audio(pairs)
     
     st.markdown("---")
     
-    # Main content area
-    if session_complete(df):
-        render_session_complete_ui(df)
-    elif st.session_state.user_answer is not None:
-        # Show feedback
-        render_feedback_ui(st.session_state.current_question)
-    else:
-        # Generate new question if needed
-        if st.session_state.current_question is None:
-            next_pair_id = select_next_pair(df)
-            
-            if next_pair_id is None:
-                render_session_complete_ui(df)
-            else:
-                st.session_state.current_pair_id = next_pair_id
-                st.session_state.current_question = create_question(next_pair_id, df)
-        
-        # Show question
-        if st.session_state.current_question:
-            render_question_ui(st.session_state.current_question)
+    render_practice_area(pairs)
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Cleared even when st.rerun()/st.stop() end the run early
+        st.session_state._main_running = False